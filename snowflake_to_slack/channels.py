@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from snowflake_to_slack.slack import SlackClients
+from snowflake_to_slack.slack import UnknownWorkspace
+
+logger = logging.getLogger("snowflake-to-slack")
+
+CHANNEL_ID = re.compile(r"^[CG][A-Z0-9]{6,}$")
+
+
+class InvalidChannel(Exception):
+    pass
+
+
+class ChannelDirectory:
+    """Slack channels of one workspace cached on disk.
+
+    Channels are loaded with paginated `conversations.list` and stored in
+    `cache_path` for `ttl` seconds.
+    """
+
+    def __init__(self, slack_client: WebClient, cache_path: str, ttl: int) -> None:
+        token_hash = hashlib.sha256((slack_client.token or "").encode()).hexdigest()
+        self.slack_client = slack_client
+        cache_dir = Path(cache_path).expanduser()
+        self.cache_file = cache_dir / f"channels-{token_hash[:16]}.json"
+        self.ttl = ttl
+        self._channels: Optional[Dict[str, Dict[str, Any]]] = None
+        self._names: Dict[str, str] = {}
+        self._fresh = False
+
+    def _read_cache(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Read channels from cache file if it is not expired.
+
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: channels by id.
+        """
+        try:
+            with open(self.cache_file, encoding="utf-8") as cache:
+                content = json.load(cache)
+        except (OSError, ValueError):
+            return None
+        if time.time() - content.get("created", 0) > self.ttl:
+            return None
+        return content.get("channels")
+
+    def _fetch(self) -> Dict[str, Dict[str, Any]]:
+        """Fetch channels from Slack and store them into cache file.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: channels by id.
+        """
+        channels = {}
+        for page in self.slack_client.conversations_list(
+            types="public_channel,private_channel", limit=1000
+        ):
+            for channel in page["channels"]:
+                channels[channel["id"]] = {
+                    "name": channel.get("name"),
+                    "is_archived": channel.get("is_archived", False),
+                    "is_member": channel.get("is_member", False),
+                }
+        # Cached channel ids decide where messages are posted, keep them private
+        self.cache_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with open(self.cache_file, "w", encoding="utf-8") as cache:
+            json.dump({"created": time.time(), "channels": channels}, cache)
+        self._fresh = True
+        return channels
+
+    def _load(self, refresh: bool = False) -> None:
+        """Load channels from cache or from Slack.
+
+        Args:
+            refresh (bool): ignore cache file.
+        """
+        channels = None if refresh else self._read_cache()
+        self._channels = channels if channels is not None else self._fetch()
+        self._names = {
+            channel["name"]: channel_id
+            for channel_id, channel in self._channels.items()
+        }
+
+    def _find(self, channel: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Find channel by `#name` or id.
+
+        Args:
+            channel (str): channel name or id.
+
+        Returns:
+            Optional[Tuple[str, Dict[str, Any]]]: channel id and channel.
+        """
+        if self._channels is None:
+            self._load()
+        if channel.startswith("#"):
+            channel_id = self._names.get(channel[1:].lower(), "")
+        else:
+            channel_id = channel
+        found = self._channels.get(channel_id)  # type: ignore
+        return (channel_id, found) if found else None
+
+    @staticmethod
+    def _reject(
+        channel: str, found: Optional[Tuple[str, Dict[str, Any]]]
+    ) -> Optional[str]:
+        """Get reason why we cannot post into channel.
+
+        Args:
+            channel (str): channel name or id.
+            found (Optional[Tuple[str, Dict[str, Any]]]): channel id and channel.
+
+        Returns:
+            Optional[str]: error message, None if channel is valid.
+        """
+        if not found:
+            return f"Slack channel {channel} does not exist!"
+        if found[1]["is_archived"]:
+            return f"Slack channel {channel} is archived!"
+        if not found[1]["is_member"]:
+            return f"Slack app is not member of channel {channel}!"
+        return None
+
+    def resolve(self, channel: str) -> str:
+        """Resolve channel to channel id and check we can post there.
+
+        Only `#name` and channel ids are checked, user names and ids are
+        returned unchanged.
+
+        Args:
+            channel (str): channel name or id.
+
+        Raises:
+            InvalidChannel: Channel does not exist, is archived or we are not member.
+
+        Returns:
+            str: channel id
+        """
+        if not (channel.startswith("#") or CHANNEL_ID.match(channel)):
+            return channel
+        found = self._find(channel)
+        # Channel could be created, unarchived or joined after cache file was stored
+        if self._reject(channel, found) and not self._fresh:
+            self._load(refresh=True)
+            found = self._find(channel)
+        error = self._reject(channel, found)
+        if error:
+            raise InvalidChannel(error)
+        return found[0]  # type: ignore
+
+
+class ChannelResolver:
+    """Resolve and validate channels of all workspaces once."""
+
+    def __init__(self, slack_clients: SlackClients, cache_path: str, ttl: int) -> None:
+        self.slack_clients = slack_clients
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._directories: Dict[str, ChannelDirectory] = {}
+        self._resolved: Dict[Tuple[Optional[str], str], Union[str, Exception]] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, workspace: Optional[str], channel: str) -> str:
+        slack_client = self.slack_clients.get(workspace)
+        token = slack_client.token or ""
+        if token not in self._directories:
+            self._directories[token] = ChannelDirectory(
+                slack_client, self.cache_path, self.ttl
+            )
+        return self._directories[token].resolve(channel)
+
+    def resolve(self, workspace: Optional[str], channel: str) -> str:
+        """Resolve channel of workspace to channel id.
+
+        Args:
+            workspace (Optional[str]): name of workspace.
+            channel (str): channel name or id.
+
+        Raises:
+            InvalidChannel: Channel is not valid.
+            UnknownWorkspace: There is no token for workspace.
+
+        Returns:
+            str: channel id
+        """
+        with self._lock:
+            if (workspace, channel) not in self._resolved:
+                try:
+                    self._resolved[(workspace, channel)] = self._resolve(
+                        workspace, channel
+                    )
+                except (InvalidChannel, SlackApiError, UnknownWorkspace) as e:
+                    self._resolved[(workspace, channel)] = e
+            resolved = self._resolved[(workspace, channel)]
+        if isinstance(resolved, Exception):
+            raise resolved
+        return resolved
+
+    def validate(self, targets: Iterable[Tuple[Optional[str], str]]) -> None:
+        """Validate all distinct channels before sending.
+
+        Rows with invalid channel are rejected later by `resolve` without
+        calling Slack again.
+
+        Args:
+            targets (Iterable[Tuple[Optional[str], str]]): workspaces and channels.
+        """
+        for workspace, channel in sorted(set(targets), key=str):
+            try:
+                self.resolve(workspace, channel)
+            except (InvalidChannel, SlackApiError, UnknownWorkspace) as e:
+                logger.error(f"Invalid Slack channel {channel}: {e}")
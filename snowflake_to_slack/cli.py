@@ -1,10 +1,15 @@
 import logging
+import os
 from datetime import datetime
 from typing import Any
+from typing import Dict
 
 import click
 
+from snowflake_to_slack.message import deliver_messages
+from snowflake_to_slack.message import render_messages
 from snowflake_to_slack.message import send_messages
+from snowflake_to_slack.slack import get_workspace_tokens
 
 
 LOG_FORMAT = "%(levelname)s\t%(message)s"
@@ -71,8 +76,21 @@ snowflake = [
     ),
 ]
 
-slack = [
+slack_auth = [
     click.option("--slack-token", envvar="SLACK_TOKEN", help="Slack Token."),
+    click.option(
+        "--slack-workspace-token",
+        envvar="SLACK_WORKSPACE_TOKENS",
+        multiple=True,
+        help=(
+            "Slack Token of workspace in `<workspace>=<token>` format. Rows with "
+            "`SLACK_WORKSPACE` column are sent with token of given workspace. "
+            "Can be used multiple times."
+        ),
+    ),
+]
+
+slack = [
     click.option(
         "--slack-channel",
         envvar="SLACK_CHANNEL",
@@ -104,7 +122,36 @@ slack = [
     ),
 ]
 
-other = [
+channels = [
+    click.option(
+        "--validate-channels",
+        is_flag=True,
+        show_default=True,
+        envvar="VALIDATE_CHANNELS",
+        help=(
+            "Validate all Slack channels before sending and reject rows with "
+            "unknown, archived or non-member channels. Requires `channels:read` "
+            "and `groups:read` scopes."
+        ),
+    ),
+    click.option(
+        "--channel-cache-path",
+        default=os.path.join("~", ".cache", "snowflake-to-slack"),
+        show_default=True,
+        envvar="CHANNEL_CACHE_PATH",
+        help="Directory where list of Slack channels is cached.",
+    ),
+    click.option(
+        "--channel-cache-ttl",
+        default=3600,
+        show_default=True,
+        type=click.IntRange(min=0),
+        envvar="CHANNEL_CACHE_TTL",
+        help="How many seconds is cached list of Slack channels valid.",
+    ),
+]
+
+run = [
     click.option(
         "--fail-fast",
         is_flag=True,
@@ -119,6 +166,9 @@ other = [
         envvar="DRY_RUN",
         help="Just print message into stdout. Do not send message to Slack.",
     ),
+]
+
+other = [
     click.option(
         "--date-valid",
         default=datetime.now().strftime("%Y-%m-%d"),
@@ -126,19 +176,76 @@ other = [
         envvar="DATE_VALID",
         help="Date valid. Default current date.",
     ),
-    click.option("--sql", envvar="SQL", required=True, help="SQL command to run."),
+    click.option("--sql", envvar="SQL", help="SQL command to run."),
+    click.option(
+        "--from-query-id",
+        envvar="FROM_QUERY_ID",
+        help=(
+            "Reuse result of already finished Snowflake query with this ID "
+            "instead of running `--sql` again."
+        ),
+    ),
     click.option(
         "--template-path",
         envvar="TEMPLATE_PATH",
         required=True,
         help="Path with your Jinja templates.",
     ),
+    click.option(
+        "--spool-path",
+        envvar="SPOOL_PATH",
+        help=(
+            "Render messages into this spool file instead of sending them to Slack. "
+            "Send them later with `snowflake-to-slack-deliver`."
+        ),
+    ),
 ]
 
+deliver = [
+    click.option(
+        "--spool-path",
+        envvar="SPOOL_PATH",
+        required=True,
+        help="Path of spool file with rendered messages.",
+    ),
+    click.option(
+        "--workers",
+        default=4,
+        show_default=True,
+        type=click.IntRange(min=1),
+        envvar="WORKERS",
+        help="Number of Slack channels sent concurrently, messages of one channel "
+        "are sent in order.",
+    ),
+]
+
+
+def _check_slack_tokens(kwargs: Dict[str, Any]) -> None:
+    try:
+        kwargs.update(
+            workspace_tokens=get_workspace_tokens(kwargs.get("slack_workspace_token"))
+        )
+    except ValueError as e:
+        logger.error(e)
+        exit(1)
+    if not (
+        kwargs.get("slack_token")
+        or kwargs.get("workspace_tokens")
+        or kwargs.get("dry_run")
+    ):
+        logger.error(
+            "Slack token parameter is missing. Please use `--slack-token`, "
+            "`--slack-workspace-token` or run it with `--dry-run` parameter!"
+        )
+        exit(1)
+
 
 @click.command(help="Send data from Snowflake into Slack.")
 @add_options(snowflake)
+@add_options(slack_auth)
 @add_options(slack)
+@add_options(channels)
+@add_options(run)
 @add_options(other)
 def snowflake_to_slack(**kwargs: Any) -> None:
     rsa_uri = kwargs.get("rsa_key_uri")
@@ -164,10 +271,41 @@ def snowflake_to_slack(**kwargs: Any) -> None:
             "`--private-key-pass` for Snowflake authorization."
         )
         exit(1)
-    if not (kwargs.get("slack_token") or kwargs.get("dry_run")):
+    if kwargs.get("sql") and kwargs.get("from_query_id"):
+        logger.error(
+            "You specified both `--sql` and `--from-query-id`. "
+            "Please use one or the other!"
+        )
+        exit(1)
+    if not (kwargs.get("sql") or kwargs.get("from_query_id")):
         logger.error(
-            "Slack token parameter is missing. Please use `--slack-token` "
-            "or run it with `--dry-run` parameter!"
+            "You have to provide `--sql` to run or `--from-query-id` "
+            "to reuse result of finished query."
         )
         exit(1)
+    if kwargs.get("spool_path") and kwargs.get("dry_run"):
+        logger.error(
+            "Parameter `--dry-run` can not be used with `--spool-path`. "
+            "Use `--dry-run` with `snowflake-to-slack-deliver` instead."
+        )
+        exit(1)
+    if kwargs.get("spool_path") and kwargs.get("validate_channels"):
+        logger.error(
+            "Parameter `--validate-channels` can not be used with `--spool-path`. "
+            "Use it with `snowflake-to-slack-deliver` instead."
+        )
+        exit(1)
+    if kwargs.get("spool_path"):
+        render_messages(**kwargs)
+    _check_slack_tokens(kwargs)
     send_messages(**kwargs)
+
+
+@click.command(help="Deliver rendered messages from spool file into Slack.")
+@add_options(slack_auth)
+@add_options(deliver)
+@add_options(run)
+@add_options(channels)
+def snowflake_to_slack_deliver(**kwargs: Any) -> None:
+    _check_slack_tokens(kwargs)
+    deliver_messages(**kwargs)
@@ -1,4 +1,8 @@
 import logging
+import threading
+import time
+from concurrent.futures import as_completed
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
 from datetime import datetime
 from datetime import timedelta
@@ -6,17 +10,29 @@ from pathlib import Path
 from typing import Any
 from typing import Dict
 from typing import Generator
+from typing import List
+from typing import Optional
 from typing import Set
+from typing import Tuple
 
 import jinja2
-from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from snowflake.connector import DictCursor
 
+from snowflake_to_slack.channels import ChannelResolver
+from snowflake_to_slack.channels import InvalidChannel
+from snowflake_to_slack.slack import SlackClients
+from snowflake_to_slack.slack import UnknownWorkspace
 from snowflake_to_slack.snowflake import snowflake_connect
+from snowflake_to_slack.spool import DeliveredWriter
+from snowflake_to_slack.spool import read_delivered
+from snowflake_to_slack.spool import read_spool
+from snowflake_to_slack.spool import SpoolWriter
 
 logger = logging.getLogger("snowflake-to-slack")
 
+RATE_LIMIT_RETRIES = 5
+
 
 class SingletonMeta(type):
 
@@ -39,19 +55,29 @@ class JinjaEnv(jinja2.Environment, metaclass=SingletonMeta):
 
 def _get_snowflake_messages(
     **kwargs: Any,
-) -> Generator[DictCursor, None, None]:
+) -> Generator[Dict[str, Any], None, None]:
     """Get messages from Snowflake.
 
     Args:
         kwargs: key value arguments.
 
     Yields:
-        Generator[DictCursor, None, None]: Generator of Snowflake messages.
+        Generator[Dict[str, Any], None, None]: Generator of Snowflake messages.
     """
     sql_cmd = kwargs.pop("sql")
+    query_id = kwargs.pop("from_query_id", None)
     with snowflake_connect(**kwargs) as con:
         with closing(con.cursor(DictCursor)) as cur:
-            cur.execute(sql_cmd)
+            if query_id:
+                # Fetch stored result instead of running the query again
+                logger.info(f"Reusing result of Snowflake query {query_id}")
+                cur.execute("SELECT * FROM TABLE(RESULT_SCAN(%s))", (query_id,))
+            else:
+                cur.execute(sql_cmd)
+                logger.info(
+                    f"Snowflake query ID: {cur.sfqid}. Use `--from-query-id "
+                    f"{cur.sfqid}` to reuse its result."
+                )
             for msg in cur:
                 yield msg
 
@@ -142,18 +168,44 @@ def _met_conditions(date_: datetime, tags: Set[str]) -> bool:
     return any(results)
 
 
-def _send_message(
+def _get_target(msg: Dict[str, Any], **kwargs: Any) -> Tuple[Optional[str], str]:
+    """Get Slack workspace and channel of message.
+
+    Args:
+        msg (Dict[str, Any]): Snowflake message
+
+    Returns:
+        Tuple[Optional[str], str]: workspace and channel
+    """
+    channel = kwargs.get("slack_channel") or msg.get("SLACK_CHANNEL", "")
+    return msg.get("SLACK_WORKSPACE"), channel
+
+
+def _is_due(msg: Dict[str, Any], date_: datetime, **kwargs: Any) -> bool:
+    """Should the message be sent at date valid?
+
+    Args:
+        msg (Dict[str, Any]): Snowflake message
+        date_ (datetime): Date valid
+
+    Returns:
+        bool: Message should be sent.
+    """
+    frequency = kwargs.get("slack_frequency") or msg.get("SLACK_FREQUENCY") or "always"
+    tags = _get_frequency_tags(frequency)
+    return bool(kwargs.get("dry_run") or _met_conditions(date_=date_, tags=tags))
+
+
+def _render_message(
     jinja_env: JinjaEnv,
-    slack_client: WebClient,
     msg: Dict[str, Any],
     date_: datetime,
     **kwargs: Any,
-) -> int:
-    """Send message to slack
+) -> Optional[Dict[str, Any]]:
+    """Render Snowflake message into Slack payload
 
     Args:
         jinja_env (JinjaEnv): jinja2 environment
-        slack_client (WebClient): Slack client
         msg (Dict[str, Any]): Snowflake message
         date_ (datetime): Date valid
 
@@ -161,49 +213,212 @@ def _send_message(
         MissingMessage: Message has no test or template
 
     Returns:
-        int: status code
+        Optional[Dict[str, Any]]: rendered payload or None if conditions are not met
     """
-    status_code = 0
-    channel = kwargs.get("slack_channel") or msg.get("SLACK_CHANNEL", "")
-    frequency = kwargs.get("slack_frequency") or msg.get("SLACK_FREQUENCY") or "always"
+    workspace, channel = _get_target(msg, **kwargs)
     msg_template = kwargs.get("slack_message_template") or msg.get(
         "SLACK_MESSAGE_TEMPLATE"
     )
     msg_text = kwargs.get("slack_message_text") or msg.get("SLACK_MESSAGE_TEXT")
-    tags = _get_frequency_tags(frequency)
     blocks = None
-    if kwargs.get("dry_run") or _met_conditions(date_=date_, tags=tags):
-        try:
-            # If snowflake message contanins message template
-            if msg_template:
-                blocks = _render_template(jinja_env, msg_template, msg)
-            # If snowflake message contanins message text
-            elif msg_text:
-                pass
-            else:
-                raise MissingMessage(
-                    "Every row in Snowflake table has to have `SLACK_MESSAGE_TEMPLATE`"
-                    " or/and `SLACK_MESSAGE_TEXT` columns!"
-                )
-            if kwargs.get("dry_run"):
-                logger.info(f"Channel: {channel}\nBlocks: {blocks}\nText: {msg_text}")
-            else:
+    if not _is_due(msg, date_, **kwargs):
+        return None
+    # If snowflake message contanins message template
+    if msg_template:
+        blocks = _render_template(jinja_env, msg_template, msg)
+    # If snowflake message contanins message text
+    elif msg_text:
+        pass
+    else:
+        raise MissingMessage(
+            "Every row in Snowflake table has to have `SLACK_MESSAGE_TEMPLATE`"
+            " or/and `SLACK_MESSAGE_TEXT` columns!"
+        )
+    return {
+        "channel": channel,
+        "blocks": blocks,
+        "text": msg_text,
+        "workspace": workspace,
+    }
+
+
+def _post_message(
+    slack_clients: SlackClients,
+    payload: Dict[str, Any],
+    channel_resolver: Optional[ChannelResolver] = None,
+    **kwargs: Any,
+) -> None:
+    """Post rendered payload to slack
+
+    Args:
+        slack_clients (SlackClients): Slack clients by workspace
+        payload (Dict[str, Any]): rendered payload
+        channel_resolver (Optional[ChannelResolver]): resolver of channel ids
+
+    Raises:
+        UnknownWorkspace: There is no token for workspace of payload
+        InvalidChannel: Channel of payload is not valid
+    """
+    channel = payload["channel"]
+    blocks = payload["blocks"]
+    msg_text = payload["text"]
+    if kwargs.get("dry_run"):
+        logger.info(f"Channel: {channel}\nBlocks: {blocks}\nText: {msg_text}")
+    else:
+        workspace = payload.get("workspace")
+        if channel_resolver:
+            channel = channel_resolver.resolve(workspace, channel)
+        slack_client = slack_clients.get(workspace)
+        retries = 0
+        while True:
+            try:
                 slack_client.chat_postMessage(
                     channel=channel, blocks=blocks, text=msg_text
                 )
-        except (
-            jinja2.TemplateNotFound,
-            jinja2.TemplateError,
-            MissingMessage,
-            SlackApiError,
-        ) as e:
-            logger.error(f"Snowflake row: {msg}\n" f"Error: {e}")
-            if kwargs.get("fail_fast"):
-                raise
-            status_code = 1
+                return
+            except SlackApiError as e:
+                status = getattr(e.response, "status_code", None)
+                if status != 429 or retries == RATE_LIMIT_RETRIES:
+                    raise
+                retry_after = int(e.response.headers.get("Retry-After", 1))
+                logger.warning(
+                    f"Slack rate limit reached, retrying in {retry_after} seconds."
+                )
+                time.sleep(retry_after)
+                retries += 1
+
+
+def _send_message(
+    jinja_env: JinjaEnv,
+    slack_clients: SlackClients,
+    msg: Dict[str, Any],
+    date_: datetime,
+    channel_resolver: Optional[ChannelResolver] = None,
+    **kwargs: Any,
+) -> int:
+    """Send message to slack
+
+    Args:
+        jinja_env (JinjaEnv): jinja2 environment
+        slack_clients (SlackClients): Slack clients by workspace
+        msg (Dict[str, Any]): Snowflake message
+        date_ (datetime): Date valid
+        channel_resolver (Optional[ChannelResolver]): resolver of channel ids
+
+    Returns:
+        int: status code
+    """
+    status_code = 0
+    try:
+        payload = _render_message(jinja_env=jinja_env, msg=msg, date_=date_, **kwargs)
+        if payload:
+            _post_message(slack_clients, payload, channel_resolver, **kwargs)
+    except (
+        jinja2.TemplateNotFound,
+        jinja2.TemplateError,
+        MissingMessage,
+        SlackApiError,
+        UnknownWorkspace,
+        InvalidChannel,
+    ) as e:
+        logger.error(f"Snowflake row: {msg}\n" f"Error: {e}")
+        if kwargs.get("fail_fast"):
+            raise
+        status_code = 1
     return status_code
 
 
+def _spool_message(
+    jinja_env: JinjaEnv,
+    spool: SpoolWriter,
+    msg: Dict[str, Any],
+    date_: datetime,
+    **kwargs: Any,
+) -> int:
+    """Render message and write it into spool
+
+    Args:
+        jinja_env (JinjaEnv): jinja2 environment
+        spool (SpoolWriter): spool writer
+        msg (Dict[str, Any]): Snowflake message
+        date_ (datetime): Date valid
+
+    Returns:
+        int: status code
+    """
+    status_code = 0
+    try:
+        payload = _render_message(jinja_env=jinja_env, msg=msg, date_=date_, **kwargs)
+        if payload:
+            spool.write(payload)
+    except (
+        jinja2.TemplateNotFound,
+        jinja2.TemplateError,
+        MissingMessage,
+    ) as e:
+        logger.error(f"Snowflake row: {msg}\n" f"Error: {e}")
+        if kwargs.get("fail_fast"):
+            raise
+        status_code = 1
+    return status_code
+
+
+def _deliver_payload(
+    slack_clients: SlackClients,
+    payload: Dict[str, Any],
+    channel_resolver: Optional[ChannelResolver] = None,
+    **kwargs: Any,
+) -> int:
+    """Deliver rendered payload from spool to slack
+
+    Args:
+        slack_clients (SlackClients): Slack clients by workspace
+        payload (Dict[str, Any]): rendered payload
+        channel_resolver (Optional[ChannelResolver]): resolver of channel ids
+
+    Returns:
+        int: status code
+    """
+    status_code = 0
+    try:
+        _post_message(slack_clients, payload, channel_resolver, **kwargs)
+    except (SlackApiError, UnknownWorkspace, InvalidChannel) as e:
+        logger.error(f"Spool payload: {payload}\n" f"Error: {e}")
+        if kwargs.get("fail_fast"):
+            raise
+        status_code = 1
+    return status_code
+
+
+def _get_slack_clients(**kwargs: Any) -> SlackClients:
+    """Get Slack clients for default token and workspace tokens.
+
+    Returns:
+        SlackClients: Slack clients by workspace
+    """
+    return SlackClients(
+        slack_token=kwargs.get("slack_token"),
+        workspace_tokens=kwargs.get("workspace_tokens"),
+    )
+
+
+def _get_channel_resolver(
+    slack_clients: SlackClients, **kwargs: Any
+) -> Optional[ChannelResolver]:
+    """Get resolver of channel ids if channels should be validated.
+
+    Returns:
+        Optional[ChannelResolver]: resolver of channel ids
+    """
+    if not kwargs.get("validate_channels") or kwargs.get("dry_run"):
+        return None
+    return ChannelResolver(
+        slack_clients,
+        cache_path=kwargs.get("channel_cache_path", ""),
+        ttl=kwargs.get("channel_cache_ttl", 0),
+    )
+
+
 def _process_messages(**kwargs: Any) -> int:
     """Process messages from Snowflake and send them to Slack.
 
@@ -212,16 +427,149 @@ def _process_messages(**kwargs: Any) -> int:
     """
     date_ = _get_date_valid(**kwargs)
     jinja_env = _get_jinja_env(**kwargs)
-    slack_client = WebClient(token=kwargs.get("slack_token"))
+    slack_clients = _get_slack_clients(**kwargs)
+    channel_resolver = _get_channel_resolver(slack_clients, **kwargs)
     status_code = 0
-    for msg in _get_snowflake_messages(**kwargs):
-        status_code |= _send_message(
-            jinja_env=jinja_env,
-            slack_client=slack_client,
-            msg=msg,
-            date_=date_,
-            **kwargs,
-        )
+    try:
+        rows = _get_snowflake_messages(**kwargs)
+        # Fetch whole result set to validate its channels before sending
+        msgs = list(rows) if channel_resolver else rows
+        if channel_resolver:
+            channel_resolver.validate(
+                _get_target(msg, **kwargs)
+                for msg in msgs
+                if _is_due(msg, date_, **kwargs)
+            )
+        for msg in msgs:
+            status_code |= _send_message(
+                jinja_env=jinja_env,
+                slack_clients=slack_clients,
+                msg=msg,
+                date_=date_,
+                channel_resolver=channel_resolver,
+                **kwargs,
+            )
+    finally:
+        slack_clients.close()
+    return status_code
+
+
+def _render_messages(**kwargs: Any) -> int:
+    """Render messages from Snowflake into spool file.
+
+    Returns:
+        int: Status code
+    """
+    date_ = _get_date_valid(**kwargs)
+    jinja_env = _get_jinja_env(**kwargs)
+    spool_path = kwargs.get("spool_path", "")
+    status_code = 0
+    with SpoolWriter(spool_path) as spool:
+        for msg in _get_snowflake_messages(**kwargs):
+            status_code |= _spool_message(
+                jinja_env=jinja_env,
+                spool=spool,
+                msg=msg,
+                date_=date_,
+                **kwargs,
+            )
+    logger.info(f"Rendered {spool.count} messages into {spool_path}")
+    return status_code
+
+
+def _deliver_channel(
+    slack_clients: SlackClients,
+    payloads: List[Dict[str, Any]],
+    channel_resolver: Optional[ChannelResolver],
+    delivered: DeliveredWriter,
+    stop: threading.Event,
+    **kwargs: Any,
+) -> int:
+    """Deliver rendered payloads of one channel in spool order
+
+    Args:
+        slack_clients (SlackClients): Slack clients by workspace
+        payloads (List[Dict[str, Any]]): rendered payloads of channel
+        channel_resolver (Optional[ChannelResolver]): resolver of channel ids
+        delivered (DeliveredWriter): delivered keys file
+        stop (threading.Event): set when delivery fails fast
+
+    Returns:
+        int: status code
+    """
+    status_code = 0
+    for payload in payloads:
+        if stop.is_set():
+            break
+        try:
+            result = _deliver_payload(
+                slack_clients, payload, channel_resolver, **kwargs
+            )
+        except Exception:
+            stop.set()
+            raise
+        if not (result or kwargs.get("dry_run")):
+            delivered.write(payload["key"])
+        status_code |= result
+    return status_code
+
+
+def _deliver_messages(**kwargs: Any) -> int:
+    """Deliver rendered messages from spool file to Slack.
+
+    Messages of one channel are sent one by one in spool order, channels are
+    sent concurrently. Keys of delivered payloads are appended next to the
+    spool file, so rerun of delivery sends only missing messages.
+
+    Returns:
+        int: Status code
+    """
+    spool_path = kwargs.get("spool_path", "")
+    if not Path(spool_path).is_file():
+        logger.error(f"Spool file {spool_path} does not exists!")
+        exit(1)
+    slack_clients = _get_slack_clients(**kwargs)
+    channel_resolver = _get_channel_resolver(slack_clients, **kwargs)
+    seen = read_delivered(spool_path)
+    channels: Dict[Tuple[Optional[str], str], List[Dict[str, Any]]] = {}
+    for payload in read_spool(spool_path):
+        if payload["key"] in seen:
+            continue
+        seen.add(payload["key"])
+        target = (payload.get("workspace"), payload["channel"])
+        channels.setdefault(target, []).append(payload)
+    status_code = 0
+    stop = threading.Event()
+    try:
+        if channel_resolver:
+            channel_resolver.validate(channels)
+        with DeliveredWriter(spool_path) as delivered, ThreadPoolExecutor(
+            max_workers=kwargs.get("workers") or 1
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _deliver_channel,
+                    slack_clients,
+                    payloads,
+                    channel_resolver,
+                    delivered,
+                    stop,
+                    **kwargs,
+                )
+                for payloads in channels.values()
+            ]
+            try:
+                for future in as_completed(futures):
+                    status_code |= future.result()
+            except Exception:
+                # Fail fast: do not send queued messages, running channels
+                # stop after their current message
+                stop.set()
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        slack_clients.close()
     return status_code
 
 
@@ -233,3 +581,23 @@ def send_messages(**kwargs: Any) -> int:
     """
     status_code = _process_messages(**kwargs)
     exit(status_code)
+
+
+def render_messages(**kwargs: Any) -> int:
+    """Render Messages from Snowflake into spool file.
+
+    Args:
+        kwargs: key value arguments.
+    """
+    status_code = _render_messages(**kwargs)
+    exit(status_code)
+
+
+def deliver_messages(**kwargs: Any) -> int:
+    """Deliver Messages from spool file into Slack.
+
+    Args:
+        kwargs: key value arguments.
+    """
+    status_code = _deliver_messages(**kwargs)
+    exit(status_code)
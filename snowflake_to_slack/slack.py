@@ -0,0 +1,198 @@
+import http.client
+import json
+import threading
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+from urllib.parse import urlencode
+from urllib.parse import urlparse
+
+from slack_sdk import WebClient
+
+
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+)
+
+
+class UnknownWorkspace(Exception):
+    pass
+
+
+class PooledWebClient(WebClient):
+    """Slack client reusing keep-alive HTTP connections.
+
+    `WebClient` opens new HTTPS connection through urllib for every API call.
+    This client keeps one persistent connection per thread, so TLS handshake
+    is paid only once per worker. Requests through proxy and file uploads
+    are left to `WebClient`.
+
+    It overrides private `_perform_urllib_http_request` of `slack-sdk==3.4.2`
+    and keeps its behavior: gzip bodies are returned as bytes, `Retry-After`
+    header is set on 429 responses and failed requests are logged.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[http.client.HTTPConnection] = []
+
+    def _get_connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        """Get persistent connection of current thread.
+
+        Args:
+            scheme (str): URL scheme.
+            netloc (str): URL host and port.
+
+        Returns:
+            http.client.HTTPConnection: connection
+        """
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if (scheme, netloc) not in connections:
+            if scheme == "https":
+                connection: http.client.HTTPConnection = http.client.HTTPSConnection(
+                    netloc, timeout=self.timeout, context=self.ssl
+                )
+            else:
+                connection = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            connections[(scheme, netloc)] = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connections[(scheme, netloc)]
+
+    # Depends on internals of pinned slack-sdk==3.4.2, check it on upgrade
+    def _perform_urllib_http_request(
+        self, *, url: str, args: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        if self.proxy or args["data"] or not url.lower().startswith("http"):
+            return super()._perform_urllib_http_request(url=url, args=args)
+        headers = args["headers"]
+        body: Optional[str] = None
+        if args["json"]:
+            body = json.dumps(args["json"])
+            headers["Content-Type"] = "application/json;charset=utf-8"
+        elif args["params"]:
+            body = urlencode(args["params"])
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        parsed = urlparse(url)
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+        connection = self._get_connection(parsed.scheme.lower(), parsed.netloc)
+        data = body.encode("utf-8") if body is not None else None
+        reused = connection.sock is not None
+        try:
+            try:
+                connection.request("POST", path, body=data, headers=headers)
+                resp = connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                # Only reused keep-alive connection could be closed by server
+                # before our request, otherwise request might be processed
+                if not reused:
+                    raise
+                connection.close()
+                connection.request("POST", path, body=data, headers=headers)
+                resp = connection.getresponse()
+            # Read whole body here, partially read response breaks connection
+            response_body: Union[str, bytes] = resp.read()
+        except Exception as err:
+            connection.close()
+            self._logger.error(f"Failed to send a request to Slack API server: {err}")
+            raise
+        response_headers = resp.headers
+        if response_headers.get_content_type() != "application/gzip":
+            charset = response_headers.get_content_charset() or "utf-8"
+            response_body = response_body.decode(charset)  # type: ignore
+        if resp.status == 429 and "retry-after" in response_headers:
+            # for compatibility with WebClient
+            retry_after = response_headers["retry-after"]
+            del response_headers["retry-after"]
+            response_headers["Retry-After"] = retry_after
+        return {
+            "status": resp.status,
+            "headers": response_headers,
+            "body": response_body,
+        }
+
+    def close(self) -> None:
+        """Close all persistent connections."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+
+class SlackClients:
+    """Reuse one pooled Slack client per Slack token."""
+
+    def __init__(
+        self,
+        slack_token: Optional[str] = None,
+        workspace_tokens: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.slack_token = slack_token
+        self.workspace_tokens = workspace_tokens or {}
+        self._clients: Dict[str, PooledWebClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self, workspace: Optional[str] = None) -> PooledWebClient:
+        """Get Slack client of workspace.
+
+        Args:
+            workspace (Optional[str]): name of workspace, default token if empty.
+
+        Raises:
+            UnknownWorkspace: There is no token for workspace.
+
+        Returns:
+            PooledWebClient: Slack client
+        """
+        if workspace:
+            token = self.workspace_tokens.get(workspace)
+        else:
+            token = self.slack_token
+        if not token:
+            raise UnknownWorkspace(
+                f"Slack token for workspace `{workspace}` is missing! Please use "
+                "`--slack-workspace-token` parameter."
+                if workspace
+                else "Slack token is missing! Please use `--slack-token` parameter."
+            )
+        with self._lock:
+            if token not in self._clients:
+                self._clients[token] = PooledWebClient(token=token)
+            return self._clients[token]
+
+    def close(self) -> None:
+        """Close connections of all Slack clients."""
+        for client in self._clients.values():
+            client.close()
+
+
+def get_workspace_tokens(values: Any) -> Dict[str, str]:
+    """Parse `<workspace>=<token>` values.
+
+    Args:
+        values (Any): list of `<workspace>=<token>` values.
+
+    Raises:
+        ValueError: Value is not in `<workspace>=<token>` format.
+
+    Returns:
+        Dict[str, str]: tokens by workspace name.
+    """
+    workspace_tokens = {}
+    for value in values or []:
+        workspace, sep, token = value.partition("=")
+        if not (sep and workspace.strip() and token.strip()):
+            raise ValueError(
+                "Invalid `--slack-workspace-token` value. "
+                "Use `<workspace>=<token>` format."
+            )
+        workspace_tokens[workspace.strip()] = token.strip()
+    return workspace_tokens
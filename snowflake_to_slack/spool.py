@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Optional
+from typing import Set
+from typing import TextIO
+
+
+SPOOL_FIELDS = ("channel", "blocks", "text", "workspace", "key")
+
+
+class SpoolWriter:
+    """Stream rendered payloads into newline-delimited JSON spool file.
+
+    Payloads are written into temporary file which replaces the spool file
+    only when rendering succeeds. Every payload gets key of its render run
+    and row, and delivered keys of previous spool are removed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.count = 0
+        self.run_id = uuid.uuid4().hex
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> "SpoolWriter":
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp"
+        )
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        self._file.close()  # type: ignore
+        if exc_type is not None:
+            os.remove(self._tmp_path)
+            return
+        os.replace(self._tmp_path, self.path)
+        # New spool starts new delivery ledger
+        try:
+            os.remove(get_delivered_path(self.path))
+        except FileNotFoundError:
+            pass
+
+    def write(self, payload: Dict[str, Any]) -> None:
+        """Write rendered payload into spool file.
+
+        Args:
+            payload (Dict[str, Any]): rendered payload.
+        """
+        record = {field: payload.get(field) for field in SPOOL_FIELDS}
+        record["key"] = f"{self.run_id}-{self.count}"
+        self._file.write(  # type: ignore
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        )
+        self.count += 1
+
+
+class DeliveredWriter:
+    """Append keys of delivered payloads next to the spool file.
+
+    Keys are written by delivery threads and flushed one by one, so
+    interrupted delivery does not send them again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = get_delivered_path(path)
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> "DeliveredWriter":
+        self._file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._file.close()  # type: ignore
+
+    def write(self, key: str) -> None:
+        """Write key of delivered payload.
+
+        Args:
+            key (str): key of payload.
+        """
+        with self._lock:
+            self._file.write(f"{key}\n")  # type: ignore
+            self._file.flush()  # type: ignore
+
+
+def read_spool(path: str) -> Generator[Dict[str, Any], None, None]:
+    """Read rendered payloads from spool file.
+
+    Args:
+        path (str): path of spool file.
+
+    Yields:
+        Generator[Dict[str, Any], None, None]: Generator of rendered payloads.
+    """
+    with open(path, encoding="utf-8") as spool:
+        for line in spool:
+            if line.strip():
+                yield json.loads(line)
+
+
+def get_delivered_path(path: str) -> str:
+    """Get path of file with keys of already delivered payloads.
+
+    Args:
+        path (str): path of spool file.
+
+    Returns:
+        str: path of delivered keys file.
+    """
+    return f"{path}.delivered"
+
+
+def read_delivered(path: str) -> Set[str]:
+    """Read keys of already delivered payloads.
+
+    Args:
+        path (str): path of spool file.
+
+    Returns:
+        Set[str]: set of delivered keys.
+    """
+    delivered_path = Path(get_delivered_path(path))
+    if not delivered_path.is_file():
+        return set()
+    with open(delivered_path, encoding="utf-8") as delivered:
+        return {line.strip() for line in delivered if line.strip()}
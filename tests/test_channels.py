@@ -0,0 +1,122 @@
+import json
+import os
+import stat
+import time
+import unittest.mock as mock
+
+import pytest
+
+from snowflake_to_slack.channels import ChannelDirectory
+from snowflake_to_slack.channels import ChannelResolver
+from snowflake_to_slack.channels import InvalidChannel
+from snowflake_to_slack.slack import SlackClients
+from snowflake_to_slack.slack import UnknownWorkspace
+
+CHANNEL_PAGES = [
+    {
+        "channels": [
+            {"id": "C0000001", "name": "general", "is_member": True},
+            {"id": "C0000002", "name": "old", "is_archived": True, "is_member": True},
+        ]
+    },
+    {"channels": [{"id": "C0000003", "name": "other", "is_member": False}]},
+]
+
+
+def _get_directory(tmp_path, ttl=3600):
+    slack_client = SlackClients(slack_token="123").get()
+    return ChannelDirectory(slack_client, str(tmp_path), ttl)
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_resolve(conversations_list, tmp_path):
+    directory = _get_directory(tmp_path)
+    assert directory.resolve("#general") == "C0000001"
+    assert directory.resolve("#General") == "C0000001"
+    assert directory.resolve("C0000001") == "C0000001"
+    assert directory.resolve("U0000001") == "U0000001"
+    assert directory.resolve("john.doe") == "john.doe"
+    with pytest.raises(InvalidChannel, match="archived"):
+        directory.resolve("#old")
+    with pytest.raises(InvalidChannel, match="member"):
+        directory.resolve("#other")
+    with pytest.raises(InvalidChannel, match="does not exist"):
+        directory.resolve("#missing")
+    with pytest.raises(InvalidChannel, match="does not exist"):
+        directory.resolve("C0000009")
+    assert conversations_list.call_count == 1
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_cache(conversations_list, tmp_path):
+    _get_directory(tmp_path).resolve("#general")
+    directory = _get_directory(tmp_path)
+    assert directory.resolve("#general") == "C0000001"
+    assert conversations_list.call_count == 1
+    # Unknown channel refreshes cached channels once
+    with pytest.raises(InvalidChannel):
+        directory.resolve("#missing")
+    with pytest.raises(InvalidChannel):
+        directory.resolve("#missing2")
+    assert conversations_list.call_count == 2
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_cache_rejected(conversations_list, tmp_path):
+    directory = _get_directory(tmp_path)
+    channels = {
+        "C0000001": {"name": "general", "is_archived": True, "is_member": True},
+        "C0000003": {"name": "other", "is_archived": False, "is_member": False},
+    }
+    directory.cache_file.write_text(
+        json.dumps({"created": time.time(), "channels": channels})
+    )
+    # Channel unarchived after cache file was stored refreshes cached channels
+    assert directory.resolve("#general") == "C0000001"
+    assert conversations_list.call_count == 1
+    # Refreshed channels are not refreshed again
+    with pytest.raises(InvalidChannel, match="member"):
+        directory.resolve("#other")
+    assert conversations_list.call_count == 1
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_cache_dir_permissions(conversations_list, tmp_path):
+    cache_path = tmp_path / "cache"
+    directory = _get_directory(cache_path)
+    assert directory.resolve("#general") == "C0000001"
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o700
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_expired_cache(conversations_list, tmp_path):
+    directory = _get_directory(tmp_path)
+    directory.cache_file.write_text(json.dumps({"created": 0, "channels": {}}))
+    assert directory.resolve("#general") == "C0000001"
+    assert conversations_list.call_count == 1
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_invalid_cache(conversations_list, tmp_path):
+    directory = _get_directory(tmp_path)
+    directory.cache_file.write_text("{")
+    assert directory.resolve("#general") == "C0000001"
+    assert conversations_list.call_count == 1
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+def test_resolver(conversations_list, tmp_path, caplog):
+    slack_clients = SlackClients(slack_token="123", workspace_tokens={"a": "123"})
+    resolver = ChannelResolver(slack_clients, str(tmp_path), 3600)
+    resolver.validate(
+        [(None, "#general"), ("a", "#general"), (None, "#old"), ("b", "#general")]
+    )
+    assert "#old" in caplog.text
+    assert "workspace `b`" in caplog.text
+    assert resolver.resolve(None, "#general") == "C0000001"
+    assert resolver.resolve("a", "#general") == "C0000001"
+    with pytest.raises(InvalidChannel):
+        resolver.resolve(None, "#old")
+    with pytest.raises(UnknownWorkspace):
+        resolver.resolve("b", "#general")
+    assert conversations_list.call_count == 1
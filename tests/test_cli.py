@@ -1,3 +1,5 @@
+import threading
+import time
 import unittest.mock as mock
 
 import jinja2
@@ -6,7 +8,11 @@ from click.testing import CliRunner
 from slack_sdk.errors import SlackApiError
 
 from snowflake_to_slack.cli import snowflake_to_slack
+from snowflake_to_slack.cli import snowflake_to_slack_deliver
 from snowflake_to_slack.message import MissingMessage
+from snowflake_to_slack.spool import read_delivered
+from snowflake_to_slack.spool import read_spool
+from snowflake_to_slack.spool import SpoolWriter
 
 DAILY_DB_DATA = [
     {
@@ -59,6 +65,19 @@ MISSING_TEMPLATE = [
 ]
 
 
+WORKSPACE_DB_DATA = [
+    {
+        "SLACK_CHANNEL": "test",
+        "SLACK_MESSAGE_TEXT": "Hi!",
+        "SLACK_WORKSPACE": "a",
+    },
+    {
+        "SLACK_CHANNEL": "test",
+        "SLACK_MESSAGE_TEXT": "Hi!",
+        "SLACK_WORKSPACE": "b",
+    },
+]
+
 NO_FREQUENCY_DB_DATA = [
     {
         "SLACK_CHANNEL": "test",
@@ -165,6 +184,34 @@ TESTS = (
         REQUIRED_PARAMS + ["--password", "test", "--slack-token", "123"],
         0,
     ),
+    (
+        WORKSPACE_DB_DATA,
+        REQUIRED_PARAMS
+        + [
+            "--password",
+            "test",
+            "--slack-workspace-token",
+            "a=123",
+            "--slack-workspace-token",
+            "b=456",
+        ],
+        0,
+    ),
+    (
+        WORKSPACE_DB_DATA,
+        REQUIRED_PARAMS + ["--password", "test", "--slack-workspace-token", "a=123"],
+        1,
+    ),
+    (
+        WORKSPACE_DB_DATA,
+        REQUIRED_PARAMS + ["--password", "test", "--slack-workspace-token", "a"],
+        1,
+    ),
+    (
+        ONLY_TEXT,
+        REQUIRED_PARAMS + ["--password", "test", "--slack-workspace-token", "a=123"],
+        1,
+    ),
 )
 
 
@@ -248,3 +295,400 @@ def test_slac_error(snow, _):
     params = REQUIRED_PARAMS + ["--password", "test", "--slack-token", "123"]
     result = runner.invoke(snowflake_to_slack, params)
     assert result.exit_code == 1
+
+
+@mock.patch("snowflake.connector.connect")
+def test_render_spool(snow, tmp_path):
+    runner = CliRunner()
+    mock_con = snow.return_value
+    mock_cur = mock_con.cursor.return_value
+    mock_cur.__iter__.return_value = iter(MULTIPLE_DAILY_DB_DATA + ONLY_TEXT * 2)
+    spool_path = tmp_path / "spool.ndjson"
+    params = REQUIRED_PARAMS + ["--password", "test", "--spool-path", str(spool_path)]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 0
+    payloads = list(read_spool(str(spool_path)))
+    # Identical rows are kept as separate messages like in direct sending
+    assert [payload["channel"] for payload in payloads] == ["test", "test", "test"]
+    assert payloads[0]["blocks"]
+    assert payloads[1]["text"] == payloads[2]["text"] == "Hi!"
+    assert len({payload["key"] for payload in payloads}) == 3
+    assert set(payloads[0].keys()) == {"channel", "blocks", "text", "workspace", "key"}
+    assert list(tmp_path.iterdir()) == [spool_path]
+
+
+@mock.patch("snowflake.connector.connect")
+def test_render_spool_failed_query(snow, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    _write_spool(spool_path, SPOOL_DATA)
+    snow.side_effect = RuntimeError("Connection failed")
+    params = REQUIRED_PARAMS + ["--password", "test", "--spool-path", str(spool_path)]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 1
+    # Previous spool is kept untouched
+    assert len(list(read_spool(str(spool_path)))) == 3
+    assert list(tmp_path.iterdir()) == [spool_path]
+
+
+@pytest.mark.parametrize("cli_param", ("--dry-run", "--validate-channels"))
+def test_render_spool_invalid(cli_param, tmp_path):
+    runner = CliRunner()
+    params = REQUIRED_PARAMS + [
+        "--password",
+        "test",
+        "--spool-path",
+        str(tmp_path / "spool.ndjson"),
+        cli_param,
+    ]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 1
+
+
+@mock.patch("snowflake.connector.connect")
+def test_render_spool_error(snow, tmp_path):
+    runner = CliRunner()
+    mock_con = snow.return_value
+    mock_cur = mock_con.cursor.return_value
+    mock_cur.__iter__.return_value = iter(INVALID_TEMPLATE + ONLY_TEXT)
+    spool_path = tmp_path / "spool.ndjson"
+    params = REQUIRED_PARAMS + ["--password", "test", "--spool-path", str(spool_path)]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 1
+    assert len(list(read_spool(str(spool_path)))) == 1
+
+
+@mock.patch("snowflake.connector.connect")
+def test_raise_render_spool(snow, tmp_path):
+    runner = CliRunner()
+    mock_con = snow.return_value
+    mock_cur = mock_con.cursor.return_value
+    mock_cur.__iter__.return_value = iter(MISSING_TEMPLATE)
+    params = REQUIRED_PARAMS + [
+        "--password",
+        "test",
+        "--spool-path",
+        str(tmp_path / "spool.ndjson"),
+        "--fail-fast",
+    ]
+    with pytest.raises(MissingMessage):
+        runner.invoke(snowflake_to_slack, params, catch_exceptions=False)
+
+
+def _write_spool(path, payloads):
+    with SpoolWriter(str(path)) as spool:
+        for payload in payloads:
+            spool.write(payload)
+    with open(path, "a") as spool_file:
+        spool_file.write("\n")
+    return [payload["key"] for payload in read_spool(str(path))]
+
+
+SPOOL_DATA = [
+    {"channel": "test", "blocks": None, "text": "Hi!"},
+    {"channel": "test", "blocks": None, "text": "Hi!"},
+    {"channel": "test2", "blocks": None, "text": "Hello!"},
+]
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+def test_deliver(post, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    keys = _write_spool(spool_path, SPOOL_DATA)
+    params = ["--spool-path", str(spool_path), "--slack-token", "123"]
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 0
+    assert post.call_count == 3
+    assert read_delivered(str(spool_path)) == set(keys)
+    # Rerun sends only messages which were not delivered yet
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 0
+    assert post.call_count == 3
+    # New render starts new delivery
+    _write_spool(spool_path, SPOOL_DATA)
+    assert read_delivered(str(spool_path)) == set()
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 0
+    assert post.call_count == 6
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+def test_deliver_fail_fast(post, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    payloads = [
+        {"channel": channel, "blocks": None, "text": str(i)}
+        for channel in ("test", "test2")
+        for i in range(3)
+    ]
+    keys = _write_spool(spool_path, payloads)
+    sent = threading.Event()
+    stop = threading.Event()
+
+    def _fail_after_sent(**kwargs):
+        if kwargs["channel"] == "test2":
+            # Fail only when message of other channel was delivered
+            assert sent.wait(5)
+            raise SlackApiError("Slack error", "")
+        sent.set()
+        # Message is in flight while delivery is stopped
+        assert stop.wait(5)
+
+    post.side_effect = _fail_after_sent
+    params = ["--spool-path", str(spool_path), "--slack-token", "123"]
+    with mock.patch("snowflake_to_slack.message.threading") as message_threading:
+        message_threading.Event.return_value = stop
+        with pytest.raises(SlackApiError):
+            runner.invoke(
+                snowflake_to_slack_deliver,
+                params + ["--workers", "2", "--fail-fast"],
+                catch_exceptions=False,
+            )
+    sent_messages = [
+        (call.kwargs["channel"], call.kwargs["text"]) for call in post.call_args_list
+    ]
+    # Queued messages are not sent
+    assert sorted(sent_messages) == [("test", "0"), ("test2", "0")]
+    # Messages sent before the failure are recorded
+    delivered = read_delivered(str(spool_path))
+    assert delivered
+    assert delivered == {keys[0]}
+
+
+def _slow_first(**kwargs):
+    # Earlier messages take longer, so concurrent rows would be reordered
+    time.sleep((4 - int(kwargs["text"])) * 0.01)
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage", side_effect=_slow_first)
+def test_deliver_channel_order(post, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    payloads = [
+        {"channel": channel, "blocks": None, "text": str(i)}
+        for i in range(5)
+        for channel in ("test", "test2")
+    ]
+    _write_spool(spool_path, payloads)
+    params = ["--spool-path", str(spool_path), "--slack-token", "123"]
+    result = runner.invoke(snowflake_to_slack_deliver, params + ["--workers", "4"])
+    assert result.exit_code == 0
+    for channel in ("test", "test2"):
+        sent = [
+            call.kwargs["text"]
+            for call in post.call_args_list
+            if call.kwargs["channel"] == channel
+        ]
+        assert sent == ["0", "1", "2", "3", "4"]
+
+
+def _rate_limit_error():
+    response = mock.Mock(status_code=429, headers={"Retry-After": "0"})
+    return SlackApiError("ratelimited", response)
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+def test_deliver_rate_limit(post, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    keys = _write_spool(spool_path, SPOOL_DATA[:1])
+    params = ["--spool-path", str(spool_path), "--slack-token", "123"]
+    post.side_effect = [_rate_limit_error(), None]
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 0
+    assert post.call_count == 2
+    assert read_delivered(str(spool_path)) == set(keys)
+    # Message is failed when rate limit lasts
+    _write_spool(spool_path, SPOOL_DATA[:1])
+    post.reset_mock()
+    post.side_effect = _rate_limit_error()
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 1
+    assert post.call_count == 6
+    assert read_delivered(str(spool_path)) == set()
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+def test_deliver_dry_run(post, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    _write_spool(spool_path, SPOOL_DATA)
+    params = ["--spool-path", str(spool_path), "--dry-run"]
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 0
+    assert post.call_count == 0
+    assert read_delivered(str(spool_path)) == set()
+
+
+@mock.patch(
+    "slack_sdk.WebClient.chat_postMessage", side_effect=SlackApiError("Slack error", "")
+)
+def test_deliver_slack_error(_, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    _write_spool(spool_path, SPOOL_DATA)
+    params = ["--spool-path", str(spool_path), "--slack-token", "123"]
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 1
+    assert read_delivered(str(spool_path)) == set()
+    with pytest.raises(SlackApiError):
+        runner.invoke(
+            snowflake_to_slack_deliver,
+            params + ["--fail-fast"],
+            catch_exceptions=False,
+        )
+
+
+@pytest.mark.parametrize(
+    "cli_params",
+    (
+        ["--spool-path", "fake", "--slack-token", "123"],
+        ["--spool-path", "fake"],
+    ),
+)
+def test_deliver_invalid(cli_params):
+    runner = CliRunner()
+    result = runner.invoke(snowflake_to_slack_deliver, cli_params)
+    assert result.exit_code == 1
+
+
+CHANNEL_PAGES = [
+    {
+        "channels": [
+            {"id": "C0000001", "name": "general", "is_member": True},
+            {"id": "C0000002", "name": "old", "is_archived": True, "is_member": True},
+        ]
+    },
+]
+
+CHANNELS_DB_DATA = [
+    {"SLACK_CHANNEL": "#general", "SLACK_MESSAGE_TEXT": "Hi!"},
+    {"SLACK_CHANNEL": "#general", "SLACK_MESSAGE_TEXT": "Hello!"},
+    {"SLACK_CHANNEL": "#old", "SLACK_MESSAGE_TEXT": "Hi!"},
+    {
+        "SLACK_CHANNEL": "#missing",
+        "SLACK_MESSAGE_TEXT": "Hi!",
+        "SLACK_FREQUENCY": "never",
+    },
+]
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+@mock.patch("snowflake.connector.connect")
+def test_validate_channels(snow, post, conversations_list, tmp_path, caplog):
+    runner = CliRunner()
+    mock_con = snow.return_value
+    mock_cur = mock_con.cursor.return_value
+    mock_cur.__iter__.return_value = iter(CHANNELS_DB_DATA)
+    params = REQUIRED_PARAMS + [
+        "--password",
+        "test",
+        "--slack-token",
+        "123",
+        "--validate-channels",
+        "--channel-cache-path",
+        str(tmp_path),
+    ]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 1
+    assert conversations_list.call_count == 1
+    assert "Invalid Slack channel #old" in caplog.text
+    # Rows which are not sent today are not validated
+    assert "#missing" not in caplog.text
+    assert [call.kwargs["channel"] for call in post.call_args_list] == [
+        "C0000001",
+        "C0000001",
+    ]
+
+
+@mock.patch("slack_sdk.WebClient.conversations_list", return_value=CHANNEL_PAGES)
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+def test_deliver_validate_channels(post, conversations_list, tmp_path):
+    runner = CliRunner()
+    spool_path = tmp_path / "spool.ndjson"
+    keys = _write_spool(
+        spool_path,
+        [
+            {"channel": "#general", "blocks": None, "text": "Hi!"},
+            {"channel": "#old", "blocks": None, "text": "Hi!"},
+        ],
+    )
+    params = [
+        "--spool-path",
+        str(spool_path),
+        "--slack-token",
+        "123",
+        "--validate-channels",
+        "--channel-cache-path",
+        str(tmp_path),
+    ]
+    result = runner.invoke(snowflake_to_slack_deliver, params)
+    assert result.exit_code == 1
+    assert post.call_count == 1
+    assert post.call_args.kwargs["channel"] == "C0000001"
+    assert read_delivered(str(spool_path)) == {keys[0]}
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+@mock.patch("snowflake.connector.connect")
+def test_query_id_logged(snow, post, caplog):
+    runner = CliRunner()
+    mock_con = snow.return_value
+    mock_cur = mock_con.cursor.return_value
+    mock_cur.__iter__.return_value = iter(DAILY_DB_DATA)
+    mock_cur.sfqid = "01a2b3c4-0000-1111-0000-000000000001"
+    params = REQUIRED_PARAMS + ["--password", "test", "--slack-token", "123"]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 0
+    mock_cur.execute.assert_called_once_with("SELECT 1")
+    assert "--from-query-id 01a2b3c4-0000-1111-0000-000000000001" in caplog.text
+
+
+@mock.patch("slack_sdk.WebClient.chat_postMessage")
+@mock.patch("snowflake.connector.connect")
+def test_from_query_id(snow, post):
+    runner = CliRunner()
+    mock_con = snow.return_value
+    mock_cur = mock_con.cursor.return_value
+    mock_cur.__iter__.return_value = iter(DAILY_DB_DATA)
+    params = BASIC_PARAMS[:-2] + [
+        "--template-path",
+        "./tests/test_templates",
+        "--password",
+        "test",
+        "--slack-token",
+        "123",
+        "--from-query-id",
+        "01a2b3c4-0000-1111-0000-000000000001",
+    ]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 0
+    mock_cur.execute.assert_called_once_with(
+        "SELECT * FROM TABLE(RESULT_SCAN(%s))",
+        ("01a2b3c4-0000-1111-0000-000000000001",),
+    )
+    assert post.call_count == 1
+
+
+@mock.patch("snowflake.connector.connect")
+def test_missing_sql(snow):
+    runner = CliRunner()
+    params = BASIC_PARAMS[:-2] + [
+        "--template-path",
+        "./tests/test_templates",
+        "--password",
+        "test",
+        "--slack-token",
+        "123",
+    ]
+    result = runner.invoke(snowflake_to_slack, params)
+    assert result.exit_code == 1
+    assert snow.call_count == 0
+    result = runner.invoke(
+        snowflake_to_slack,
+        REQUIRED_PARAMS + params[-4:] + ["--from-query-id", "01a2b3c4"],
+    )
+    assert result.exit_code == 1
+    assert snow.call_count == 0
@@ -0,0 +1,187 @@
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+from snowflake_to_slack.slack import get_workspace_tokens
+from snowflake_to_slack.slack import PooledWebClient
+from snowflake_to_slack.slack import SlackClients
+from snowflake_to_slack.slack import UnknownWorkspace
+
+
+class SlackHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.server.bodies.append(self.rfile.read(length))
+        if self.server.reset_connections:
+            # Close connection after request was processed without response
+            self.close_connection = True
+            return
+        body = self.server.body
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", self.server.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in self.server.extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.flush()
+        # Body which comes too late
+        self.server.body_sent.wait(self.server.body_delay)
+        self.wfile.write(body)
+        # Drop keep-alive connection without telling the client
+        self.close_connection = self.server.drop_connections
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slack_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlackHandler)
+    server.connections = 0
+    server.bodies = []
+    server.drop_connections = False
+    server.reset_connections = False
+    server.status = 200
+    server.content_type = "application/json; charset=utf-8"
+    server.body = json.dumps({"ok": True}).encode()
+    server.extra_headers = {}
+    server.body_delay = 0
+    server.body_sent = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.body_sent.set()
+    server.shutdown()
+    server.server_close()
+
+
+def _get_client(server):
+    return PooledWebClient(
+        token="xoxb-test", base_url=f"http://127.0.0.1:{server.server_port}/"
+    )
+
+
+def test_pooled_client_reuses_connection(slack_server):
+    client = _get_client(slack_server)
+    client.chat_postMessage(channel="test", text="Hi!")
+    client.chat_postMessage(channel="test", text="Hello!")
+    client.conversations_list(limit=10)
+    client.api_call("api.test")
+    client.close()
+    assert slack_server.connections == 1
+    assert json.loads(slack_server.bodies[1]) == {"channel": "test", "text": "Hello!"}
+    assert slack_server.bodies[2] == b"limit=10"
+    assert slack_server.bodies[3] == b""
+
+
+def test_pooled_client_reconnects(slack_server):
+    slack_server.drop_connections = True
+    client = _get_client(slack_server)
+    assert client.chat_postMessage(channel="test", text="Hi!")["ok"]
+    assert client.chat_postMessage(channel="test", text="Hello!")["ok"]
+    client.close()
+    assert slack_server.connections == 2
+
+
+def test_pooled_client_no_retry_fresh_connection(slack_server):
+    slack_server.reset_connections = True
+    client = _get_client(slack_server)
+    with pytest.raises(http.client.RemoteDisconnected):
+        client.chat_postMessage(channel="test", text="Hi!")
+    client.close()
+    # Message could be already posted, so it is not sent again
+    assert len(slack_server.bodies) == 1
+
+
+def test_pooled_client_slow_body(slack_server):
+    slack_server.body_delay = 5
+    client = PooledWebClient(
+        token="xoxb-test",
+        base_url=f"http://127.0.0.1:{slack_server.server_port}/",
+        timeout=0.5,
+    )
+    with pytest.raises(OSError):
+        client.chat_postMessage(channel="test", text="Hi!")
+    slack_server.body_sent.set()
+    slack_server.body_delay = 0
+    # Broken connection is not reused and message is sent on new one
+    assert client.chat_postMessage(channel="test", text="Hello!")["ok"]
+    client.close()
+    assert slack_server.connections == 2
+    assert len(slack_server.bodies) == 2
+
+
+def test_pooled_client_gzip(slack_server):
+    slack_server.content_type = "application/gzip"
+    slack_server.body = b"\x1f\x8b"
+    client = _get_client(slack_server)
+    response = client._perform_urllib_http_request(
+        url=f"{client.base_url}admin.analytics.getFile",
+        args={"headers": {}, "data": None, "params": {"a": "b"}, "json": None},
+    )
+    client.close()
+    assert response["body"] == b"\x1f\x8b"
+
+
+def test_pooled_client_rate_limited(slack_server):
+    slack_server.status = 429
+    slack_server.body = json.dumps({"ok": False, "error": "ratelimited"}).encode()
+    slack_server.extra_headers = {"retry-after": "3"}
+    client = _get_client(slack_server)
+    with pytest.raises(SlackApiError) as e:
+        client.chat_postMessage(channel="test", text="Hi!")
+    client.close()
+    assert e.value.response.status_code == 429
+    assert e.value.response.headers["Retry-After"] == "3"
+
+
+def test_pooled_client_fallback(slack_server):
+    client = _get_client(slack_server)
+    response = client._perform_urllib_http_request(
+        url=f"{client.base_url}files.upload",
+        args={"headers": {}, "data": {"a": "b"}, "params": None, "json": None},
+    )
+    assert response["status"] == 200
+    assert slack_server.connections == 1
+
+
+def test_pooled_client_https():
+    client = PooledWebClient(token="xoxb-test")
+    connection = client._get_connection("https", "slack.com")
+    assert isinstance(connection, http.client.HTTPSConnection)
+    assert client._get_connection("https", "slack.com") is connection
+    client.close()
+
+
+def test_slack_clients():
+    clients = SlackClients(
+        slack_token="default", workspace_tokens={"a": "token-a", "b": "default"}
+    )
+    assert clients.get().token == "default"
+    assert clients.get("a").token == "token-a"
+    assert clients.get("b") is clients.get()
+    with pytest.raises(UnknownWorkspace):
+        clients.get("c")
+    with pytest.raises(UnknownWorkspace):
+        SlackClients().get()
+    clients.close()
+
+
+def test_get_workspace_tokens():
+    assert get_workspace_tokens(None) == {}
+    assert get_workspace_tokens(["a=1", " b = 2 "]) == {"a": "1", "b": "2"}
+    with pytest.raises(ValueError):
+        get_workspace_tokens(["a"])
+    with pytest.raises(ValueError):
+        get_workspace_tokens(["a="])